@@ -2,12 +2,42 @@
 import itertools
 import functools
 import warnings
+import collections
+import textwrap
 
 import scipy.integrate
+import scipy.sparse
+import scipy.sparse.linalg
 import numpy as np
 import toolz
 import networkx
 
+try:
+    from numba import njit, cfunc, carray, float64
+    from numba.core.errors import NumbaError
+
+    _NUMBA = True
+except ImportError:  # numba is optional, the kernels also run as plain python (only slower)
+    _NUMBA = False
+
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda func: func
+
+
+try:
+    from numba import cuda
+except ImportError:  # numba is optional, it is only needed for the CUDA ensemble solvers
+    cuda = None
+
+
+LSODASystem = collections.namedtuple("LSODASystem", "cfunc address data")
+LSODASystem.__doc__ = """A compiled dynamic system: a `numbalsoda.lsoda_sig` cfunc, its address and its data.
+
+The cfunc is kept to tie the lifetime of the compiled code to the system.
+"""
+
 
 def integrate(dy, yinit, x, f_args=(), integrator="dopri5", **integrator_args):
     """
@@ -16,16 +46,35 @@ def integrate(dy, yinit, x, f_args=(), integrator="dopri5", **integrator_args):
     Uselful if you do not want to step through the integration, but rather get
     the full result in one call.
 
-    :param dy: `callable(x, y, *args)`
+    If dy is a `LSODASystem` the integration is done by odeint_fast(), i.e.
+    with lsoda; other integrators are not supported for compiled systems.
+
+    :param dy: `callable(x, y, *args)` or `LSODASystem`
     :param yinit: sequence of initial values.
     :param x: sequence of x values.
     :param f_args: (optional) extra arguments to pass to function.
     :returns: y(x)
     """
+    if isinstance(dy, LSODASystem):
+        if f_args:
+            raise ValueError("Extra function arguments are not supported for compiled systems.")
+        if integrator not in ("dopri5", "lsoda"):
+            raise ValueError(
+                "Compiled systems are integrated with lsoda, got integrator={!r}.".format(integrator)
+            )
+        y, success = odeint_fast(dy.address, yinit, x, data=dy.data, **integrator_args)
+        y = y.T
+        if not success:
+            y[:] = np.NAN
+        if y.shape[0] == 1:
+            return y[0, :]
+        return y
     res = odeint(dy, yinit, x, f_args=f_args, integrator=integrator, **integrator_args)
-    y = np.vstack(list(res)).T
-    if y.shape[1] != x.shape[0]:
-        y = np.empty((y.shape[0], x.shape[0]))
+    y = np.empty((np.size(yinit), len(x)))
+    n = 0
+    for n, yi in enumerate(res, 1):
+        y[:, n - 1] = yi
+    if n != len(x):
         y[:] = np.NAN
     if y.shape[0] == 1:
         return y[0, :]
@@ -38,16 +87,20 @@ def odeint(dy, yinit, x, f_args=(), integrator="dopri5", **integrator_args):
 
     A wrapper around scipy.integrate.ode.
 
-    :param dy: `callable(x, y, *args)`
+    :param dy: `callable(x, y, *args)`, if dy.accepts_out it is called with an
+               additional out array to write the result into.
     :param yinit: sequence of initial values.
     :param x: sequence of x values.
     :param f_args: (optional) extra arguments to pass to function.
     :yields: y(x_i)
     """
 
+    # Right hand sides with an out argument may write into the same buffer on every call.
+    kwargs = dict(out=np.empty(np.size(yinit))) if getattr(dy, "accepts_out", False) else {}
+
     @functools.wraps(dy)
     def f(x, y):
-        return dy(x, y, *f_args)
+        return dy(x, y, *f_args, **kwargs)
 
     ode = scipy.integrate.ode(f)
     ode.set_integrator(integrator, **integrator_args)
@@ -64,7 +117,75 @@ def odeint(dy, yinit, x, f_args=(), integrator="dopri5", **integrator_args):
             yield ode.y
 
 
+def odeint_fast(funcptr, yinit, x, data=None, rtol=1e-8, atol=1e-8, **integrator_args):
+    """
+    Integrate the initial value problem (funcptr, yinit) in compiled code.
+
+    A wrapper around numbalsoda.lsoda. The integrator calls the right hand side
+    through a C function pointer, i.e. it never re-enters the python interpreter.
+
+    :param funcptr: address of a cfunc with signature `numbalsoda.lsoda_sig`.
+    :param yinit: sequence of initial values.
+    :param x: sequence of x values.
+    :param data: (optional) parameters passed on to the right hand side.
+    :returns: (y(x), success)
+    """
+    lsoda = _require_numbalsoda("odeint_fast").lsoda
+    yinit = np.asarray(yinit, dtype=np.float64)
+    t_eval = np.asarray(x, dtype=np.float64)
+    data = np.asarray(data if data is not None else [], dtype=np.float64)
+    return lsoda(funcptr, yinit, t_eval, data=data, rtol=rtol, atol=atol, **integrator_args)
+
+
+@functools.lru_cache(maxsize=None)
+def _numbalsoda():
+    """Import numbalsoda on first use, it compiles its solvers on import which takes seconds."""
+    try:
+        import numbalsoda
+    except ImportError:  # numbalsoda is optional, it is only needed for the compiled systems
+        return None
+    return numbalsoda
+
+
+def _require_numbalsoda(name):
+    numbalsoda = _numbalsoda()
+    if numbalsoda is None:
+        raise RuntimeError("{}() requires numba and numbalsoda.".format(name))
+    return numbalsoda
+
+
 # Simple Systems
+#
+# The harmonic and anharmonic oscillator are generated from source templates
+# with their parameters baked in as literals (partial evaluation). This saves
+# the closure lookups and the parameter arithmetic on every evaluation. The
+# generated factories are cached, so a new actuator only creates a closure.
+
+_TEMPLATES = dict(
+    harmonic_oscillator="""
+        def make(actuator):
+            def dy(t, y, *args):
+                y0, y1 = y
+                return [y1, ({minus_omega_sq}) * y0 + actuator(y0, y1, *args)]
+            return dy
+        """,
+    anharmonic_oscillator="""
+        def make(actuator):
+            def dy(t, y, *args):
+                y0, y1 = y
+                return [y1, -(({omega_sq}) + ({k}) * y0) * y0 - ({c}) * y1 + actuator(y0, y1, *args)]
+            return dy
+        """,
+)
+
+
+@functools.lru_cache(maxsize=None)
+def _specialize(system, **params):
+    """Return the factory make(actuator) -> dy for system with params baked in."""
+    literals = {name: repr(float(value)) for name, value in params.items()}
+    namespace = dict(inf=np.inf, nan=np.nan)
+    exec(textwrap.dedent(_TEMPLATES[system]).format(**literals), namespace)
+    return namespace["make"]
 
 
 def harmonic_oscillator(actuator, omega=1.0):
@@ -73,24 +194,12 @@ def harmonic_oscillator(actuator, omega=1.0):
     :param actuator: callable(*y, *args).
     :param omega: angular frequency of the oscillator.
     """
-
-    def dy(t, y, *args):
-        dy0 = y[1]
-        dy1 = -(omega ** 2) * y[0] + actuator(*y, *args)
-        return [dy0, dy1]
-
-    return dy
+    return _specialize("harmonic_oscillator", minus_omega_sq=-(omega ** 2))(actuator)
 
 
 def anharmonic_oscillator(actuator, omega=1.0, c=1.0, k=1.0):
     """Return anharmonic oscillator with actuator built in."""
-
-    def dy(t, y, *args):
-        dy0 = y[1]
-        dy1 = -(omega ** 2) * y[0] - k * y[0] ** 2 - c * y[1] + actuator(*y, *args)
-        return [dy0, dy1]
-
-    return dy
+    return _specialize("anharmonic_oscillator", omega_sq=omega ** 2, c=c, k=k)(actuator)
 
 
 def lorenz_in_3(actuator, s=10.0, r=28.0, b=8.0 / 3.0):
@@ -117,19 +226,260 @@ def lorenz_in_2(actuator, s=10.0, r=28.0, b=8.0 / 3.0):
     return dy
 
 
+def integrate_batched(dy, Yinit, x, f_args=(), substeps=1):
+    """
+    Integrate an ensemble of initial value problems (dy, Yinit) at once.
+
+    Uses the classical Runge-Kutta method with a fixed step size, so dy is
+    evaluated four times per step for the whole ensemble instead of once per
+    member and step.
+
+    The state and the stages are updated in place, so no temporary arrays are
+    allocated per step. This also makes it useful for large coupled networks:
+    Yinit may just as well be a single state of shape (dim,).
+
+    :param dy: `callable(x, Y, *args)`, Y has shape (batch, dim).
+    :param Yinit: initial values of shape (batch, dim).
+    :param x: sequence of x values.
+    :param f_args: (optional) extra arguments to pass to function.
+    :param substeps: number of Runge-Kutta steps between two x values.
+    :returns: Y(x) of shape (batch, dim, len(x))
+    """
+    Y = np.array(Yinit, dtype=np.float64)
+    res = np.empty(Y.shape + (len(x),))
+    res[..., 0] = Y
+    # The stages and the state are updated in place; the flat views are passed to the kernels.
+    K1, K2, K3, K4, Ys = (np.empty_like(Y) for _ in range(5))
+    y, k1, k2, k3, k4, ys = (a.reshape(-1) for a in (Y, K1, K2, K3, K4, Ys))
+    for i in range(1, len(x)):
+        h = (x[i] - x[i - 1]) / substeps
+        t = x[i - 1]
+        for _ in range(substeps):
+            K1[...] = dy(t, Y, *f_args)
+            _rk4_stage(y, 0.5 * h, k1, ys)
+            K2[...] = dy(t + 0.5 * h, Ys, *f_args)
+            _rk4_stage(y, 0.5 * h, k2, ys)
+            K3[...] = dy(t + 0.5 * h, Ys, *f_args)
+            _rk4_stage(y, h, k3, ys)
+            K4[...] = dy(t + h, Ys, *f_args)
+            _rk4_update(y, h, k1, k2, k3, k4)
+            t += h
+        res[..., i] = Y
+    return res
+
+
+def _rk4_stage_numpy(y, a, k, out):
+    """out = y + a * k"""
+    np.multiply(k, a, out=out)
+    np.add(y, out, out=out)
+
+
+def _rk4_update_numpy(y, h, k1, k2, k3, k4):
+    """y += h / 6 * (k1 + 2 * k2 + 2 * k3 + k4), overwrites k2, k3 and k4."""
+    np.multiply(k2, 2.0, out=k2)
+    np.add(k1, k2, out=k2)
+    np.multiply(k3, 2.0, out=k3)
+    np.add(k2, k3, out=k3)
+    np.add(k3, k4, out=k4)
+    np.multiply(k4, h / 6.0, out=k4)
+    np.add(y, k4, out=y)
+
+
+if _NUMBA:
+
+    @njit(cache=True)
+    def _rk4_stage(y, a, k, out):
+        """out = y + a * k"""
+        for i in range(y.shape[0]):
+            out[i] = y[i] + a * k[i]
+
+    @njit(cache=True)
+    def _rk4_update(y, h, k1, k2, k3, k4):
+        """y += h / 6 * (k1 + 2 * k2 + 2 * k3 + k4)"""
+        for i in range(y.shape[0]):
+            y[i] += h / 6.0 * (k1[i] + 2.0 * k2[i] + 2.0 * k3[i] + k4[i])
+
+
+else:  # explicit loops would be slow in python, use in-place ufuncs instead
+    _rk4_stage, _rk4_update = _rk4_stage_numpy, _rk4_update_numpy
+
+
+# Compiled Simple Systems
+#
+# The same systems as above, but compiled into a `numbalsoda.lsoda_sig` cfunc.
+# This only works if the actuator itself is compiled with numba.njit, e.g.
+# numba.njit(sympy.lambdify(...)), and does not take constants. Compilation
+# takes some time, so this pays off for long or repeated integrations.
+
+
+def harmonic_oscillator_lsoda(actuator, omega=1.0):
+    """Return compiled harmonic oscillator with actuator built in.
+
+    :param actuator: numba compiled callable(*y).
+    :param omega: angular frequency of the oscillator.
+    """
+    lsoda_sig = _require_numbalsoda("harmonic_oscillator_lsoda").lsoda_sig
+
+    @cfunc(lsoda_sig)
+    def rhs(t, y, dy, p):
+        y_, p_ = carray(y, (2,)), carray(p, (1,))
+        dy[0] = y_[1]
+        dy[1] = -(p_[0] ** 2) * y_[0] + actuator(y_[0], y_[1])
+
+    return LSODASystem(rhs, rhs.address, np.array([omega], dtype=np.float64))
+
+
+def anharmonic_oscillator_lsoda(actuator, omega=1.0, c=1.0, k=1.0):
+    """Return compiled anharmonic oscillator with actuator built in."""
+    lsoda_sig = _require_numbalsoda("anharmonic_oscillator_lsoda").lsoda_sig
+
+    @cfunc(lsoda_sig)
+    def rhs(t, y, dy, p):
+        y_, p_ = carray(y, (2,)), carray(p, (3,))
+        dy[0] = y_[1]
+        dy[1] = -(p_[0] ** 2) * y_[0] - p_[2] * y_[0] ** 2 - p_[1] * y_[1] + actuator(y_[0], y_[1])
+
+    return LSODASystem(rhs, rhs.address, np.array([omega, c, k], dtype=np.float64))
+
+
+def lorenz_in_3_lsoda(actuator, s=10.0, r=28.0, b=8.0 / 3.0):
+    """Return compiled lorenz attractor with actuator built in."""
+    lsoda_sig = _require_numbalsoda("lorenz_in_3_lsoda").lsoda_sig
+
+    @cfunc(lsoda_sig)
+    def rhs(t, y, dy, p):
+        y_, p_ = carray(y, (3,)), carray(p, (3,))
+        dy[0] = p_[0] * (y_[1] - y_[0])
+        dy[1] = p_[1] * y_[0] - y_[1] - y_[0] * y_[2]
+        dy[2] = y_[0] * y_[1] - p_[2] * y_[2] + actuator(y_[0], y_[1], y_[2])
+
+    return LSODASystem(rhs, rhs.address, np.array([s, r, b], dtype=np.float64))
+
+
+def lorenz_in_2_lsoda(actuator, s=10.0, r=28.0, b=8.0 / 3.0):
+    """Return compiled lorenz attractor with actuator built in."""
+    lsoda_sig = _require_numbalsoda("lorenz_in_2_lsoda").lsoda_sig
+
+    @cfunc(lsoda_sig)
+    def rhs(t, y, dy, p):
+        y_, p_ = carray(y, (3,)), carray(p, (3,))
+        dy[0] = p_[0] * (y_[1] - y_[0])
+        dy[1] = p_[1] * y_[0] - y_[1] - y_[0] * y_[2] + actuator(y_[0], y_[1], y_[2])
+        dy[2] = y_[0] * y_[1] - p_[2] * y_[2]
+
+    return LSODASystem(rhs, rhs.address, np.array([s, r, b], dtype=np.float64))
+
+
+def compile_actuator(actuator, dim):
+    """Compile actuator callable(*y) with numba for the use in the compiled systems.
+
+    :param actuator: callable(*y), e.g. a lambdified sympy expression.
+    :param dim: dimension of y.
+    :returns: the compiled actuator or None, if it cannot be compiled.
+    """
+    if _numbalsoda() is None:
+        return None
+    try:
+        return njit(float64(*(float64,) * dim))(actuator)
+    except (NumbaError, TypeError):
+        return None
+
+
+def compiled(system, actuator, **params):
+    """Return the compiled variant of a simple system, if possible.
+
+    Falls back to the python right hand side if numbalsoda is not available or
+    the actuator cannot be compiled (e.g. if it takes constants).
+
+    Each call compiles the actuator and the right hand side, which takes about
+    0.1s, and numba never frees the compiled code. This only pays off for long
+    or repeated integrations of the same actuator, e.g. of the final pareto
+    front, not for assessing every individual of a gp run.
+
+    :param system: harmonic_oscillator, anharmonic_oscillator, lorenz_in_3 or
+                   lorenz_in_2, optionally as functools.partial with parameters.
+    :param actuator: callable(*y).
+    :param params: parameters of the system.
+    :returns: `LSODASystem` or `callable(x, y, *args)`, both can be passed to integrate().
+    """
+    if isinstance(system, functools.partial) and not system.args:
+        return compiled(system.func, actuator, **{**system.keywords, **params})
+    try:
+        system_lsoda, dim = _COMPILED_SYSTEMS[system]
+    except (KeyError, TypeError):
+        raise ValueError("There is no compiled variant of {!r}.".format(system))
+    actuator_jit = compile_actuator(actuator, dim)
+    if actuator_jit is None:
+        return system(actuator, **params)
+    return system_lsoda(actuator_jit, **params)
+
+
+_COMPILED_SYSTEMS = {
+    harmonic_oscillator: (harmonic_oscillator_lsoda, 2),
+    anharmonic_oscillator: (anharmonic_oscillator_lsoda, 2),
+    lorenz_in_3: (lorenz_in_3_lsoda, 3),
+    lorenz_in_2: (lorenz_in_2_lsoda, 3),
+}
+
+
 # Coupled Systems
+#
+# The right hand sides are split into a compiled kernel (the dynamic system
+# itself) and a thin python closure which evaluates the actuator and the
+# coupling term. The actuator is an arbitrary python callable (usually a
+# lambdified sympy expression) and A may be a dense or a scipy.sparse matrix,
+# so neither can be evaluated in nopython mode.
+#
+# The kernels write into the optional out array. odeint() passes the same
+# buffer on every call, which is fine for scipy.integrate.ode as it copies the
+# result of the right hand side. Without out a new array is returned, as e.g.
+# scipy.integrate.solve_ivp keeps the returned arrays.
+
+
+@njit(cache=True)
+def _van_der_pol(y, u, Ay1, omega, a, b, out):
+    N = y.shape[0] // 2
+    y0, y1 = y[:N], y[N:]
+    out[:N] = y1
+    out[N:] = -(omega ** 2) * y0 + a * y1 * (1 - b * y0 ** 2) + Ay1 + u
+    return out
+
+
+@njit(cache=True)
+def _fitzhugh_nagumo(y, u, Ay1, a, b, tau, out):
+    N = y.shape[0] // 2
+    y0, y1 = y[:N], y[N:]
+    out[:N] = y0 - y0 ** 3 / 3.0 - y1
+    out[N:] = (y0 + a - b * y1) / tau + Ay1 + u
+    return out
+
+
+@njit(cache=True)
+def _hindmarsh_rose(y, u, Ay1, a, b, c, d, r, s, xR, out):
+    N = y.shape[0] // 3
+    y0, y1, y2 = y[:N], y[N : 2 * N], y[2 * N :]
+    y0_sq = y0 * y0
+    out[:N] = y1 - (a * y0 - b) * y0_sq - y2
+    out[N : 2 * N] = c - d * y0_sq - y1 + Ay1 + u
+    out[2 * N :] = r * (s * (y0 - xR) - y2)
+    return out
+
+
+def _out(y, out):
+    return np.empty(np.shape(y)) if out is None else out
 
 
 def van_der_pol(actuator, sensor=toolz.identity, omega=1.0, a=0.1, b=0.01, A=0.0):
     """Return Van der Pol oscillator with actuator built in."""
+    omega, a, b = float(omega), float(a), float(b)
 
-    def dy(t, y, *args):
+    def dy(t, y, *args, out=None):
         N = int(len(y) / 2)
-        y0, y1 = y[:N], y[N:]
-        dy0 = y1
-        dy1 = -(omega ** 2) * y0 + a * y1 * (1 - b * y0 ** 2) + A.dot(y1) + actuator(*sensor(y), *args)
-        return np.hstack((dy0, dy1))
+        u = np.asarray(actuator(*sensor(y), *args), dtype=np.float64)
+        Ay1 = np.asarray(A.dot(y[N:]), dtype=np.float64)
+        return _van_der_pol(y, u, Ay1, omega, a, b, _out(y, out))
 
+    dy.accepts_out = True
     return dy
 
 
@@ -137,14 +487,15 @@ def fitzhugh_nagumo(actuator, sensor=toolz.identity, a=0.7, b=0.8, tau=12.5, A=0
     """Return FitzHugh-Nagumo oscillator with actuator built in."""
     if tau == 0.0:
         raise RuntimeError("Division by zero for tau = {}".format(tau))
+    a, b, tau = float(a), float(b), float(tau)
 
-    def dy(t, y, *args):
+    def dy(t, y, *args, out=None):
         N = int(len(y) / 2)
-        y0, y1 = y[:N], y[N:]
-        dy0 = y0 - y0 ** 3 / 3.0 - y1
-        dy1 = (y0 + a - b * y1) / tau + A.dot(y1) + actuator(*sensor(y), *args)
-        return np.hstack((dy0, dy1))
+        u = np.asarray(actuator(*sensor(y), *args), dtype=np.float64)
+        Ay1 = np.asarray(A.dot(y[N:]), dtype=np.float64)
+        return _fitzhugh_nagumo(y, u, Ay1, a, b, tau, _out(y, out))
 
+    dy.accepts_out = True
     return dy
 
 
@@ -152,18 +503,236 @@ def hindmarsh_rose(
     actuator, sensor=toolz.identity, a=1.0, b=3.0, c=1.0, d=5.0, r=1e-3, s=4.0, xR=-8.0 / 5.0, A=0.0,
 ):
     """Return Hindmarsh-Rose oscillator with actuator built in."""
+    a, b, c, d, r, s, xR = map(float, (a, b, c, d, r, s, xR))
 
-    def dy(t, y, *args):
+    def dy(t, y, *args, out=None):
         N = int(len(y) / 3)
-        y0, y1, y2 = y[:N], y[N : 2 * N], y[2 * N :]
-        dy0 = y1 - a * y0 ** 3 + b * y0 ** 2 - y2
-        dy1 = c - d * y0 ** 2 - y1 + A.dot(y1) + actuator(*sensor(y), *args)
-        dy2 = r * (s * (y0 - xR) - y2)
-        return np.hstack((dy0, dy1, dy2))
+        u = np.asarray(actuator(*sensor(y), *args), dtype=np.float64)
+        Ay1 = np.asarray(A.dot(y[N : 2 * N]), dtype=np.float64)
+        return _hindmarsh_rose(y, u, Ay1, a, b, c, d, r, s, xR, _out(y, out))
+
+    dy.accepts_out = True
+    return dy
+
+
+# Batched Systems
+#
+# The same systems as above, but evaluated for a whole ensemble of states
+# Y of shape (batch, dim) at once (see integrate_batched). The actuator maps
+# Y to one control value per ensemble member, i.e. it returns shape (batch,)
+# or (batch, N) for the coupled systems. For the coupled systems the sensor
+# maps the states Y to the actuator input, just like sensor(y) above.
+
+
+def stack_actuators(actuators):
+    """Combine one actuator callable(*y, *args) per ensemble member into a batched actuator."""
+
+    def actuator(Y, *args):
+        return np.array([a(*y, *args) for a, y in zip(actuators, Y)], dtype=np.float64)
+
+    return actuator
+
+
+def lorenz_in_3_batched(actuator, s=10.0, r=28.0, b=8.0 / 3.0):
+    """Return batched lorenz attractor with actuator built in."""
+
+    def dy(t, Y, *args):
+        y0, y1, y2 = Y[:, 0], Y[:, 1], Y[:, 2]
+        dY = np.empty_like(Y)
+        dY[:, 0] = s * (y1 - y0)
+        dY[:, 1] = r * y0 - y1 - y0 * y2
+        dY[:, 2] = y0 * y1 - b * y2 + actuator(Y, *args)
+        return dY
+
+    return dy
+
+
+def lorenz_in_2_batched(actuator, s=10.0, r=28.0, b=8.0 / 3.0):
+    """Return batched lorenz attractor with actuator built in."""
+
+    def dy(t, Y, *args):
+        y0, y1, y2 = Y[:, 0], Y[:, 1], Y[:, 2]
+        dY = np.empty_like(Y)
+        dY[:, 0] = s * (y1 - y0)
+        dY[:, 1] = r * y0 - y1 - y0 * y2 + actuator(Y, *args)
+        dY[:, 2] = y0 * y1 - b * y2
+        return dY
 
     return dy
 
 
+def van_der_pol_batched(actuator, sensor=toolz.identity, omega=1.0, a=0.1, b=0.01, A=0.0):
+    """Return batched Van der Pol oscillator with actuator built in."""
+
+    def dy(t, Y, *args):
+        N = Y.shape[1] // 2
+        y0, y1 = Y[:, :N], Y[:, N:]
+        dY = np.empty_like(Y)
+        dY[:, :N] = y1
+        u = _column(actuator(sensor(Y), *args))
+        dY[:, N:] = -(omega ** 2) * y0 + a * y1 * (1 - b * y0 ** 2) + A.dot(y1.T).T + u
+        return dY
+
+    return dy
+
+
+def fitzhugh_nagumo_batched(actuator, sensor=toolz.identity, a=0.7, b=0.8, tau=12.5, A=0.0):
+    """Return batched FitzHugh-Nagumo oscillator with actuator built in."""
+    if tau == 0.0:
+        raise RuntimeError("Division by zero for tau = {}".format(tau))
+
+    def dy(t, Y, *args):
+        N = Y.shape[1] // 2
+        y0, y1 = Y[:, :N], Y[:, N:]
+        dY = np.empty_like(Y)
+        dY[:, :N] = y0 - y0 ** 3 / 3.0 - y1
+        dY[:, N:] = (y0 + a - b * y1) / tau + A.dot(y1.T).T + _column(actuator(sensor(Y), *args))
+        return dY
+
+    return dy
+
+
+def hindmarsh_rose_batched(
+    actuator, sensor=toolz.identity, a=1.0, b=3.0, c=1.0, d=5.0, r=1e-3, s=4.0, xR=-8.0 / 5.0, A=0.0,
+):
+    """Return batched Hindmarsh-Rose oscillator with actuator built in."""
+
+    def dy(t, Y, *args):
+        N = Y.shape[1] // 3
+        y0, y1, y2 = Y[:, :N], Y[:, N : 2 * N], Y[:, 2 * N :]
+        dY = np.empty_like(Y)
+        y0_sq = y0 * y0
+        dY[:, :N] = y1 - (a * y0 - b) * y0_sq - y2
+        dY[:, N : 2 * N] = c - d * y0_sq - y1 + A.dot(y1.T).T + _column(actuator(sensor(Y), *args))
+        dY[:, 2 * N :] = r * (s * (y0 - xR) - y2)
+        return dY
+
+    return dy
+
+
+def lorenz_in_3_cuda(actuator, threads_per_block=256):
+    """Return an ensemble solver for the lorenz attractor running on a CUDA device.
+
+    Each thread integrates one trajectory with the classical Runge-Kutta method
+    and keeps its state in registers. Global memory is laid out component-major,
+    i.e. (component, trajectory), such that neighbouring threads access
+    neighbouring addresses.
+
+    :param actuator: cuda device function actuator(y0, y1, y2, c), where c are
+                     the constants of the trajectory.
+    :param threads_per_block: CUDA block size.
+    :returns: callable(Yinit, params, x, consts=None, substeps=1) -> Y(x) of
+              shape (batch, 3, len(x)); params are (s, r, b) either once or per
+              trajectory, consts has shape (batch, n_consts).
+    """
+    if cuda is None:
+        raise RuntimeError("lorenz_in_3_cuda() requires numba.")
+
+    @cuda.jit(device=True)
+    def rhs(y0, y1, y2, s, r, b, c):
+        return s * (y1 - y0), r * y0 - y1 - y0 * y2, y0 * y1 - b * y2 + actuator(y0, y1, y2, c)
+
+    @cuda.jit
+    def kernel(Y, P, C, x, substeps, out):
+        i = cuda.grid(1)
+        if i >= Y.shape[1]:
+            return
+        y0, y1, y2 = Y[0, i], Y[1, i], Y[2, i]
+        s, r, b = P[0, i], P[1, i], P[2, i]
+        c = C[i]
+        out[0, 0, i], out[0, 1, i], out[0, 2, i] = y0, y1, y2
+        for k in range(1, x.shape[0]):
+            h = (x[k] - x[k - 1]) / substeps
+            for _ in range(substeps):
+                a0, a1, a2 = rhs(y0, y1, y2, s, r, b, c)
+                b0, b1, b2 = rhs(y0 + 0.5 * h * a0, y1 + 0.5 * h * a1, y2 + 0.5 * h * a2, s, r, b, c)
+                c0, c1, c2 = rhs(y0 + 0.5 * h * b0, y1 + 0.5 * h * b1, y2 + 0.5 * h * b2, s, r, b, c)
+                d0, d1, d2 = rhs(y0 + h * c0, y1 + h * c1, y2 + h * c2, s, r, b, c)
+                y0 += h / 6.0 * (a0 + 2.0 * b0 + 2.0 * c0 + d0)
+                y1 += h / 6.0 * (a1 + 2.0 * b1 + 2.0 * c1 + d1)
+                y2 += h / 6.0 * (a2 + 2.0 * b2 + 2.0 * c2 + d2)
+            out[k, 0, i], out[k, 1, i], out[k, 2, i] = y0, y1, y2
+
+    def solve(Yinit, params, x, consts=None, substeps=1):
+        Yinit = np.asarray(Yinit, dtype=np.float64)
+        batch = Yinit.shape[0]
+        params = np.broadcast_to(np.asarray(params, dtype=np.float64), (batch, 3))
+        consts = np.zeros((batch, 0)) if consts is None else np.asarray(consts, dtype=np.float64)
+        x = np.asarray(x, dtype=np.float64)
+        out = cuda.device_array((len(x), 3, batch))
+        blocks = (batch + threads_per_block - 1) // threads_per_block
+        kernel[blocks, threads_per_block](
+            cuda.to_device(np.ascontiguousarray(Yinit.T)),
+            cuda.to_device(np.ascontiguousarray(params.T)),
+            cuda.to_device(np.ascontiguousarray(consts.reshape(batch, -1))),
+            cuda.to_device(x),
+            substeps,
+            out,
+        )
+        return out.copy_to_host().transpose(2, 1, 0)
+
+    return solve
+
+
+def _column(u):
+    """Broadcast one control value per ensemble member over all oscillators."""
+    u = np.asarray(u, dtype=np.float64)
+    return u[:, np.newaxis] if u.ndim == 1 else u
+
+
+# Coupling Matrices
+#
+# All coupling matrices are sparse, either a scipy.sparse.csr_matrix or a
+# GlobalCoupling LinearOperator, such that A.dot(y1) in the coupled systems is
+# O(nnz) instead of O(N**2). Use A.toarray() if a dense matrix is required.
+
+
+class GlobalCoupling(scipy.sparse.linalg.LinearOperator):
+    """Coupling matrix for global coupling, A = 1 - N * I.
+
+    For large N, A is never stored and A.dot(v) is evaluated as sum(v) - N * v
+    in O(N). Below about 150 oscillators the dense product is faster, so the
+    dense matrix is kept instead. Being a LinearOperator, it can be scaled and
+    added to other operators, e.g. 0.5 * A.
+    """
+
+    dense_max_size = 150
+
+    def __init__(self, N):
+        super().__init__(dtype=np.float64, shape=(N, N))
+        self.N = N
+        self._dense = self.toarray() if N <= self.dense_max_size else None
+
+    def _matvec(self, v):
+        if self._dense is not None:
+            return self._dense.dot(v)
+        return v.sum(axis=0) - self.N * v
+
+    _matmat = _matvec
+
+    # dot() and matvec() skip the checks of LinearOperator for arrays, as they
+    # are called on every evaluation of the right hand side.
+
+    def dot(self, x):
+        if isinstance(x, np.ndarray) and x.shape[:1] == (self.N,):
+            return self._matvec(x)
+        return super().dot(x)
+
+    def matvec(self, x):
+        if isinstance(x, np.ndarray) and x.shape == (self.N,):
+            return self._matvec(x)
+        return super().matvec(x)
+
+    def _adjoint(self):
+        return self
+
+    def toarray(self):
+        """Return the dense coupling matrix."""
+        A = np.ones(self.shape)
+        np.fill_diagonal(A, -1.0 * float(self.N - 1))
+        return A
+
+
 def global_coupling(N):
     """Generate a coupling matrix for global coupling.
 
@@ -171,9 +740,7 @@ def global_coupling(N):
                [ 1 -2  1]
                [ 1  1 -2]
     """
-    A = np.ones((N, N))
-    np.fill_diagonal(A, -1.0 * float(N - 1))
-    return A
+    return GlobalCoupling(N)
 
 
 def pairwise_coupling(N):
@@ -182,13 +749,18 @@ def pairwise_coupling(N):
     N = 2: A = [-1  1]
                [ 1 -1]
     """
-    assert N % 2 == 0
-    a = np.array([[-1, 1], [1, -1]])
-    A = np.kron(np.eye(int(N / 2)), a)
-    return A
+    if N % 2 != 0:
+        raise ValueError("Pairwise coupling requires an even number of oscillators, got N={}.".format(N))
+    return _pairwise_coupling(int(N)).copy()
+
+
+@functools.lru_cache(maxsize=None)
+def _pairwise_coupling(N):
+    a = np.array([[-1.0, 1.0], [1.0, -1.0]])
+    return scipy.sparse.block_diag([a] * (N // 2), format="csr")
 
 
-def circular_array_coupling(N):
+def circular_array_coupling(N, use_networkx=False):
     """Generate a coupling matrix for circular array coupling.
 
     N = 4: A = [-2  1  0  1]
@@ -196,19 +768,44 @@ def circular_array_coupling(N):
                [ 0  1 -2  1]
                [ 1  0  1 -2]
     """
-    g = networkx.cycle_graph(N)
-    A = -1.0 * networkx.linalg.laplacian_matrix(g)
-    return A
+    if use_networkx:
+        g = networkx.cycle_graph(N)
+        return scipy.sparse.csr_matrix(-1.0 * networkx.linalg.laplacian_matrix(g))
+    i = np.arange(N)
+    return _coupling_from_edges(i, (i + 1) % N, N)
 
 
-def grid_2d_coupling(n, m, periodic=False):
+def grid_2d_coupling(n, m, periodic=False, use_networkx=False):
     """Generate a coupling matrix for a 2D grid of n*m oscillators.
 
     n denotes the number of rows and m the number of columns in the grid.
     """
-    g = networkx.grid_2d_graph(n, m, periodic=periodic)
-    A = -1.0 * networkx.linalg.laplacian_matrix(g, nodelist=sorted(g.nodes()))
-    return A
+    if use_networkx:
+        g = networkx.grid_2d_graph(n, m, periodic=periodic)
+        return scipy.sparse.csr_matrix(-1.0 * networkx.linalg.laplacian_matrix(g, nodelist=sorted(g.nodes())))
+    index = np.arange(n * m).reshape(n, m)
+    if periodic:
+        i = np.hstack((index.ravel(), index.ravel()))
+        j = np.hstack((np.roll(index, -1, axis=1).ravel(), np.roll(index, -1, axis=0).ravel()))
+    else:
+        i = np.hstack((index[:, :-1].ravel(), index[:-1, :].ravel()))
+        j = np.hstack((index[:, 1:].ravel(), index[1:, :].ravel()))
+    return _coupling_from_edges(i, j, n * m)
+
+
+def _coupling_from_edges(i, j, N):
+    """Return the negative graph laplacian of the undirected graph with edges (i, j) as csr matrix.
+
+    Self-loops and duplicate edges are ignored.
+    """
+    i, j = np.asarray(i), np.asarray(j)
+    mask = i != j
+    i, j = i[mask], j[mask]
+    rows, cols = np.hstack((i, j)), np.hstack((j, i))
+    adjacency = scipy.sparse.csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(N, N))
+    adjacency.data[:] = 1.0  # merge duplicate edges
+    degree = np.asarray(adjacency.sum(axis=1)).ravel()
+    return (adjacency - scipy.sparse.diags(degree)).tocsr()
 
 
 def dorogovtsev_goltsev_mendes_coupling(n):
@@ -217,5 +814,5 @@ def dorogovtsev_goltsev_mendes_coupling(n):
     n is the generation.
     """
     g = networkx.generators.dorogovtsev_goltsev_mendes_graph(n)
-    A = -1.0 * networkx.linalg.laplacian_matrix(g)
+    A = scipy.sparse.csr_matrix(-1.0 * networkx.linalg.laplacian_matrix(g))
     return A
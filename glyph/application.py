@@ -2,13 +2,19 @@
 
 import abc
 import os
+import math
+import bisect
 import sys
 import time
 import inspect
+import pickle
 import random
 import logging
 import argparse
 import operator
+import weakref
+import multiprocessing
+import multiprocessing.pool
 
 import dill
 import numpy as np
@@ -24,14 +30,68 @@ from .assessment import SingleProcessFactory
 logger = logging.getLogger(__name__)
 
 
+class FastParetoFront(deap.tools.ParetoFront):
+    """Drop-in replacement for deap.tools.ParetoFront with fast updates for two objectives.
+
+    The hall of fame keeps its entries sorted by (weighted) fitness. For a pareto
+    front of two objectives the second weighted value is then non-increasing, so
+    the entries dominating or dominated by a new individual are found by
+    bisection instead of a scan over the whole front.
+    Falls back to deap's scan for more objectives or nan values.
+    """
+
+    def __init__(self, similar=operator.eq):
+        super().__init__(similar)
+        self._sorted = True
+
+    def update(self, population):
+        for ind in population:
+            wvalues = ind.fitness.wvalues
+            if self._sorted and len(wvalues) == 2 and not any(map(math.isnan, wvalues)):
+                self._update_2d(ind)
+            else:
+                self._sorted = False  # nan values break the ordering of the front
+                super().update([ind])
+
+    def _update_2d(self, ind):
+        keys, fitness = self.keys, ind.fitness
+        w1 = fitness.wvalues[1]
+        lower, upper = bisect.bisect_left(keys, fitness), bisect.bisect_right(keys, fitness)
+        # The lexicographically next entry has the largest w1 of all greater entries.
+        if upper < len(keys) and keys[upper].wvalues[1] >= w1:
+            return
+        if any(self.similar(ind, self[len(self) - 1 - i]) for i in range(lower, upper)):
+            return
+        # Smaller entries are dominated, if their w1 is not larger, i.e. a contiguous block before lower.
+        first, last = 0, lower
+        while first < last:
+            mid = (first + last) // 2
+            if keys[mid].wvalues[1] <= w1:
+                last = mid
+            else:
+                first = mid + 1
+        if first < lower:
+            del self.items[len(self) - lower : len(self) - first]
+            del self.keys[first:lower]
+        self.insert(ind)
+
+    def clear(self):
+        super().clear()
+        self._sorted = True
+
+
 def update_pareto_front(runner):
-    runner.pareto_front.update(runner.population)
+    # Only individuals evaluated in this step can change the front, all others have been offered before.
+    runner.pareto_front.update(runner._evaluated)
 
 
 def update_logbook_record(runner):
     if not runner.mstats:
-        runner.mstats = create_stats(len(runner.population[0].fitness.values))
-    record = runner.mstats.compile(runner.population)
+        runner.mstats = create_stats(runner._fitness_array.shape[1])
+    if isinstance(runner.mstats, FitnessMultiStatistics):
+        record = runner.mstats.compile(runner._fitness_array)
+    else:  # e.g. restored from an older checkpoint
+        record = runner.mstats.compile(runner.population)
     runner.logbook.record(gen=runner.step_count, evals=runner._evals, **record)
 
 
@@ -67,7 +127,7 @@ class GPRunner(object):
 
     def init(self, pop_size):
         """Initialize the gp run."""
-        self.pareto_front = deap.tools.ParetoFront()
+        self.pareto_front = FastParetoFront()
         self.logbook = deap.tools.Logbook()
         self.mstats = None
         self.step_count = 0
@@ -85,7 +145,12 @@ class GPRunner(object):
         self._update()
 
     def _update(self):
+        # The assessment runner may also re-evaluate valid individuals, so the evaluated
+        # ones are those whose fitness has been (re-)assigned, i.e. got a new wvalues tuple.
+        wvalues = [ind.fitness.wvalues for ind in self.population]
         self._evals = self.assessment_runner(self.population)
+        self._evaluated = [ind for ind, w in zip(self.population, wvalues) if ind.fitness.wvalues is not w]
+        self._fitness_array = fitness_array(self.population)
         for cb in self.callbacks:
             cb(self)
 
@@ -143,7 +208,18 @@ def log(app):
         logger.info(line)
 
 
-DEFAULT_CALLBACKS = make_checkpoint, log
+def snapshot_pareto_front(app):
+    """Append the current pareto front to app.pareto_fronts every pareto_snapshot_frequency steps.
+
+    Snapshots are disabled if pareto_snapshot_frequency is not set. The individuals of the
+    front are not modified after insertion, so a tuple of references suffices.
+    """
+    frequency = getattr(app.args, "pareto_snapshot_frequency", None)
+    if frequency and app.gp_runner.step_count % frequency == 0:
+        app.pareto_fronts.append(tuple(app.gp_runner.pareto_front))
+
+
+DEFAULT_CALLBACKS = snapshot_pareto_front, make_checkpoint, log
 
 
 class Application(object):
@@ -274,6 +350,14 @@ class Application(object):
             default=1,
             help="do checkpointing every n generations (default: 1)",
         )
+        parser.add_argument(
+            "--pareto_snapshot_frequency",
+            dest="pareto_snapshot_frequency",
+            metavar="n",
+            type=utils.argparse.positive_int,
+            default=None,
+            help="keep a snapshot of the pareto front every n generations (default: no snapshots)",
+        )
 
 
 def default_console_app(
@@ -583,17 +667,80 @@ class CreateFactory(AFactory):
         )
 
 
+class WorkerPool:
+    """Worker pool providing the map() of a multiprocessing pool.
+
+    Like SingleProcessFactory, calling the instance returns itself. The pool is
+    closed and joined by close(), when the instance is garbage collected, or at
+    interpreter exit.
+    """
+
+    def __init__(self, pool_class, jobs=None):
+        self._pool = pool_class(jobs)
+        self._finalizer = weakref.finalize(self, self._shutdown, self._pool)
+
+    @staticmethod
+    def _shutdown(pool):
+        pool.close()
+        pool.join()
+
+    def __call__(self):
+        return self
+
+    def map(self, func, iterable):
+        return self._pool.map(func, iterable)
+
+    def close(self):
+        """Close the pool and wait for the workers to exit."""
+        self._finalizer()
+
+
+def _single_process(jobs=None):
+    return SingleProcessFactory()
+
+
+def _process_pool(jobs=None):
+    return WorkerPool(multiprocessing.Pool, jobs)
+
+
+def _thread_pool(jobs=None):
+    return WorkerPool(multiprocessing.pool.ThreadPool, jobs)
+
+
 class ParallelizationFactory(AFactory):
     """Factory class for parallel execution schemes."""
 
+    _mapping = {
+        "single": _single_process,
+        "process": _process_pool,
+        "thread": _thread_pool,
+    }
+
     @staticmethod
     def _create(args):
-        return SingleProcessFactory
+        parallel = getattr(args, "parallel", "single").lower()
+        return ParallelizationFactory.get_from_mapping(parallel)(getattr(args, "jobs", None))
 
     @staticmethod
     def add_options(parser):
         """Add available parser options."""
-        # todo
+        parser.add_argument(
+            "--parallel",
+            dest="parallel",
+            type=str,
+            default="single",
+            choices=list(ParallelizationFactory._mapping.keys()),
+            help="the parallel execution scheme for the assessment of individuals (default: single)",
+        )
+        parser.add_argument(
+            "--jobs",
+            "-j",
+            dest="jobs",
+            metavar="n",
+            type=utils.argparse.positive_int,
+            default=None,
+            help="number of worker processes or threads (default: number of cpus)",
+        )
 
 
 class ConstraintsFactory(AFactory):
@@ -656,13 +803,24 @@ class ConstraintsFactory(AFactory):
 
 
 def safe(file_name, **kwargs):
-    """Dump kwargs to file."""
+    """Dump kwargs to file.
+
+    Uses the (much faster) pickle module and falls back to dill for objects that
+    pickle cannot handle, e.g. lambdas or local functions.
+    """
+    try:
+        data = pickle.dumps(kwargs, protocol=pickle.HIGHEST_PROTOCOL)
+    except (pickle.PicklingError, AttributeError, TypeError):
+        data = dill.dumps(kwargs)
     with open(file_name, "wb") as file:
-        dill.dump(kwargs, file)
+        file.write(data)
 
 
 def load(file_name):
-    """Load data saved with safe()."""
+    """Load data saved with safe().
+
+    dill can load both, pickle and dill dumps.
+    """
     with open(file_name, "rb") as file:
         cp = dill.load(file)
     return cp
@@ -684,16 +842,44 @@ def _create_logger(verbosity, config_file, workdir):
     return logging.getLogger(__name__)
 
 
-def create_stats(n):
-    """Create deap.tools.MultiStatistics object for n fitness values."""
+def fitness_array(population):
+    """Return the fitness values of population as float array of shape (len(population), n_objectives)."""
+    return np.array([ind.fitness.values for ind in population], dtype=np.float64)
+
+
+def _column(i, array):
+    return array[:, i]
+
+
+class FitnessStatistics(deap.tools.Statistics):
+    """deap.tools.Statistics for numerical values.
+
+    compile() accepts a fitness array as returned by fitness_array(); the key
+    selects the values from it. A population is converted to a fitness array first.
+    """
+
+    def compile(self, data):
+        if not isinstance(data, np.ndarray):
+            data = fitness_array(data)
+        values = self.key(data)
+        return {key: func(values) for key, func in self.functions.items()}
+
+
+class FitnessMultiStatistics(deap.tools.MultiStatistics):
+    """deap.tools.MultiStatistics converting a population to a fitness array only once."""
 
-    def val(i, ind):
-        return ind.fitness.values[i]
+    def compile(self, data):
+        if not isinstance(data, np.ndarray):
+            data = fitness_array(data)
+        return super().compile(data)
 
+
+def create_stats(n):
+    """Create deap.tools.MultiStatistics object for n fitness values."""
     stats = dict()
     for i in range(n):
-        stats["fit{}".format(i)] = deap.tools.Statistics(toolz.partial(val, i))
-    mstats = deap.tools.MultiStatistics(**stats)
+        stats["fit{}".format(i)] = FitnessStatistics(toolz.partial(_column, i))
+    mstats = FitnessMultiStatistics(**stats)
     mstats.register("min", np.nanmin)
     mstats.register("max", np.nanmax)
     return mstats
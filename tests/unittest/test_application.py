@@ -1,3 +1,6 @@
+import pytest
+from functools import partial
+
 import glyph.application as application
 from glyph.assessment import AAssessmentRunner
 
@@ -33,3 +36,161 @@ def test_gp_runner_reproducibility(SympyIndividual):
     assert fit_vals_1 == fit_vals_2
     assert gp_runner_1.pareto_front[:] == gp_runner_2.pareto_front[:]
     assert gp_runner_1.logbook == gp_runner_2.logbook
+
+
+class AssessmentRunnerSize(AAssessmentRunner):
+    """Gives conflicting fitness values (len, -height) to every individual."""
+
+    def measure(self, individual):
+        return len(individual), -individual.height
+
+
+def test_pareto_front_update_is_incremental(SympyIndividual):
+    import random
+    import deap.tools
+
+    def update_full_front(runner):
+        full_front.update(runner.population)
+
+    full_front = deap.tools.ParetoFront()
+    callbacks = application.DEFAULT_CALLBACKS_GP_RUNNER + (update_full_front,)
+    gp_runner = application.default_gprunner(SympyIndividual, AssessmentRunnerSize(), callbacks=callbacks)
+    random.seed(1234567890)
+    gp_runner.init(20)
+    for _ in range(5):
+        gp_runner.step()
+    assert gp_runner.pareto_front[:] == full_front[:]
+
+
+class AssessmentRunnerReevaluate(AssessmentRunnerSize):
+    """Re-evaluates the whole population, with fitness values changing each time."""
+
+    def setup(self):
+        self.n = 0
+
+    def __call__(self, population):
+        self.n += 1
+        for ind in population:
+            del ind.fitness.values
+        return super().__call__(population)
+
+    def measure(self, individual):
+        return len(individual) + self.n % 3, -individual.height
+
+
+def test_pareto_front_update_reevaluate(SympyIndividual):
+    import random
+    import deap.tools
+
+    def update_full_front(runner):
+        full_front.update(runner.population)
+
+    full_front = deap.tools.ParetoFront()
+    callbacks = application.DEFAULT_CALLBACKS_GP_RUNNER + (update_full_front,)
+    assessment_runner = AssessmentRunnerReevaluate()
+    gp_runner = application.default_gprunner(SympyIndividual, assessment_runner, callbacks=callbacks)
+    random.seed(1234567890)
+    gp_runner.init(20)
+    for _ in range(3):
+        gp_runner.step()
+    assert gp_runner.pareto_front[:] == full_front[:]
+    assert [ind.fitness for ind in gp_runner.pareto_front] == [ind.fitness for ind in full_front]
+
+
+def test_create_stats():
+    from types import SimpleNamespace
+
+    values = [(1.0, 5.0), (3.0, float("nan"))]
+    population = [SimpleNamespace(fitness=SimpleNamespace(values=v)) for v in values]
+    mstats = application.create_stats(2)
+    record = mstats.compile(population)
+    assert record == dict(fit0=dict(min=1.0, max=3.0), fit1=dict(min=5.0, max=5.0))
+    assert mstats.compile(application.fitness_array(population)) == record
+
+
+def test_legacy_stats(SympyIndividual):
+    import deap.tools
+    import numpy as np
+
+    def val(i, ind):
+        return ind.fitness.values[i]
+
+    # statistics as pickled in checkpoints written before the fitness array
+    stats = {"fit{}".format(i): deap.tools.Statistics(partial(val, i)) for i in range(2)}
+    legacy = deap.tools.MultiStatistics(**stats)
+    legacy.register("min", np.nanmin)
+
+    gp_runner = application.default_gprunner(SympyIndividual, AssessmentRunnerSize())
+    gp_runner.init(4)
+    gp_runner.mstats = legacy
+    gp_runner.step()
+    fit1 = [ind.fitness.values[1] for ind in gp_runner.population]
+    assert gp_runner.logbook.chapters["fit1"][-1]["min"] == min(fit1)
+
+
+def test_safe_load(tmpdir, SympyIndividual):
+    gp_runner = application.default_gprunner(SympyIndividual, AssessmentRunnerMock())
+    gp_runner.init(4)
+    file_name = str(tmpdir.join("checkpoint.pickle"))
+
+    application.safe(file_name, runner=gp_runner, callback=lambda app: None)  # dill fallback
+    cp = application.load(file_name)
+    assert cp["runner"].population == gp_runner.population
+    assert cp["callback"](None) is None
+
+    application.safe(file_name, population=gp_runner.population)
+    assert application.load(file_name)["population"] == gp_runner.population
+
+
+@pytest.mark.parametrize("parallel", ["single", "thread", "process"])
+def test_parallelization_factory(parallel):
+    config = dict(parallel=parallel, jobs=2)
+    parallel_factory = partial(application.ParallelizationFactory.create, config)
+    pool = parallel_factory()
+    assert pool() is pool
+    try:
+        assert list(pool.map(abs, [-1, 2, -3])) == [1, 2, 3]
+    finally:
+        getattr(pool, "close", lambda: None)()
+    if parallel != "single":
+        with pytest.raises(ValueError):
+            pool.map(abs, [-1])  # the pool is closed
+        pool.close()
+
+
+@pytest.mark.parametrize("n_objectives", [2, 3])
+def test_fast_pareto_front(n_objectives):
+    import random
+    import deap.base
+    import deap.tools
+
+    class Fitness(deap.base.Fitness):
+        weights = (-1.0, 1.0, -1.0)[:n_objectives]
+
+    class Ind(list):
+        def __init__(self, values):
+            super().__init__(values)
+            self.fitness = Fitness(values)
+
+    random.seed(42)
+    front, reference = application.FastParetoFront(), deap.tools.ParetoFront()
+    for _ in range(20):
+        population = [Ind([random.randint(0, 10) for _ in range(n_objectives)]) for _ in range(20)]
+        front.update(population)
+        reference.update(population)
+        assert front[:] == reference[:]
+        assert [ind.fitness for ind in front] == [ind.fitness for ind in reference]
+
+
+def test_snapshot_pareto_front(SympyIndividual):
+    config = dict(pop_size=4, num_generations=4, seed=42, checkpoint_frequency=1, pareto_snapshot_frequency=2)
+    gp_runner = application.default_gprunner(SympyIndividual, AssessmentRunnerSize())
+    app = application.Application(config, gp_runner, callbacks=(application.snapshot_pareto_front,))
+    app.run()
+    assert len(app.pareto_fronts) == 3  # steps 0, 2 and 4
+    assert app.pareto_fronts[-1] == tuple(gp_runner.pareto_front)
+
+    del config["pareto_snapshot_frequency"]
+    app = application.Application(config, gp_runner, callbacks=(application.snapshot_pareto_front,))
+    app.run()
+    assert app.pareto_fronts == []
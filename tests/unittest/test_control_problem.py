@@ -0,0 +1,275 @@
+"""Tests for the dynamic systems of the control examples."""
+
+import os
+import sys
+import inspect
+
+import numpy as np
+import pytest
+
+THIS_FILES_DIR = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
+sys.path.insert(0, os.path.join(THIS_FILES_DIR, "../../examples/control"))
+
+import control_problem  # noqa: E402
+
+
+@pytest.mark.parametrize("N", [1, 2, 3, 4, 7])
+def test_circular_array_coupling(N):
+    A = control_problem.circular_array_coupling(N)
+    reference = control_problem.circular_array_coupling(N, use_networkx=True)
+    assert A.format == "csr"
+    np.testing.assert_array_equal(A.toarray(), reference.toarray())
+
+
+@pytest.mark.parametrize("periodic", [False, True])
+@pytest.mark.parametrize("n, m", [(1, 1), (1, 4), (2, 2), (3, 4), (4, 3)])
+def test_grid_2d_coupling(n, m, periodic):
+    A = control_problem.grid_2d_coupling(n, m, periodic=periodic)
+    reference = control_problem.grid_2d_coupling(n, m, periodic=periodic, use_networkx=True)
+    assert A.format == "csr"
+    np.testing.assert_array_equal(A.toarray(), reference.toarray())
+
+
+
+def _van_der_pol(y0, y1, u, Ay1, omega, a, b):
+    return np.hstack((y1, -(omega ** 2) * y0 + a * y1 * (1 - b * y0 ** 2) + Ay1 + u))
+
+
+def _fitzhugh_nagumo(y0, y1, u, Ay1, a, b, tau):
+    return np.hstack((y0 - y0 ** 3 / 3.0 - y1, (y0 + a - b * y1) / tau + Ay1 + u))
+
+
+def _hindmarsh_rose(y0, y1, y2, u, Ay1, a, b, c, d, r, s, xR):
+    return np.hstack(
+        (y1 - a * y0 ** 3 + b * y0 ** 2 - y2, c - d * y0 ** 2 - y1 + Ay1 + u, r * (s * (y0 - xR) - y2))
+    )
+
+
+@pytest.mark.parametrize(
+    "system, reference, params, dim",
+    [
+        (control_problem.van_der_pol, _van_der_pol, dict(omega=1.3, a=0.2, b=0.05), 2),
+        (control_problem.fitzhugh_nagumo, _fitzhugh_nagumo, dict(a=0.6, b=0.9, tau=10.0), 2),
+        (
+            control_problem.hindmarsh_rose,
+            _hindmarsh_rose,
+            dict(a=1.1, b=3.2, c=0.9, d=5.1, r=2e-3, s=3.9, xR=-1.5),
+            3,
+        ),
+    ],
+)
+def test_coupled_systems(system, reference, params, dim):
+    N = 4
+    A = control_problem.circular_array_coupling(N)
+    y = np.random.RandomState(0).randn(dim * N)
+    parts = np.split(y, dim)
+
+    def actuator(*y):
+        return np.sin(y[:N])
+
+    dy = system(actuator, A=A, **params)(0.0, y)
+    u, Ay1 = np.sin(y[:N]), A.dot(parts[1])
+    np.testing.assert_allclose(dy, reference(*parts, u, Ay1, **params), rtol=1e-12, atol=1e-12)
+
+
+@pytest.fixture
+def numbalsoda():
+    # Checked in the test instead of on collection, as importing numbalsoda takes seconds.
+    numbalsoda = control_problem._numbalsoda()
+    if numbalsoda is None:
+        pytest.skip("requires numba and numbalsoda")
+    return numbalsoda
+
+
+requires_numbalsoda = pytest.mark.usefixtures("numbalsoda")
+
+
+@requires_numbalsoda
+def test_lsoda():
+    import numba
+
+    @numba.njit("float64(float64, float64)")
+    def actuator(y0, y1):
+        return -0.5 * y1
+
+    x = np.linspace(0, 5, 21)
+    dy = control_problem.harmonic_oscillator_lsoda(actuator, omega=2.0)
+    assert isinstance(dy, control_problem.LSODASystem)
+    assert dy.address == dy.cfunc.address
+    y = control_problem.integrate(dy, [1.0, 0.0], x)
+    dy_python = control_problem.harmonic_oscillator(actuator.py_func, omega=2.0)
+    np.testing.assert_allclose(y, control_problem.integrate(dy_python, [1.0, 0.0], x), atol=1e-6)
+    with pytest.raises(ValueError):
+        control_problem.integrate(dy, [1.0, 0.0], x, integrator="vode")
+
+
+@pytest.mark.parametrize(
+    "system, system_batched, dim",
+    [
+        (control_problem.van_der_pol, control_problem.van_der_pol_batched, 2),
+        (control_problem.fitzhugh_nagumo, control_problem.fitzhugh_nagumo_batched, 2),
+        (control_problem.hindmarsh_rose, control_problem.hindmarsh_rose_batched, 3),
+    ],
+)
+def test_coupled_batched(system, system_batched, dim):
+    N = 3
+    A = control_problem.circular_array_coupling(N)
+    actuators = [lambda *y: -y[N], lambda *y: 0.5 * y[0]]
+
+    def sensor(y):
+        return np.asarray(y)[..., ::-1]
+
+    Y = np.random.RandomState(0).rand(2, dim * N)
+    dY = system_batched(control_problem.stack_actuators(actuators), sensor, A=A)(0.0, Y)
+    for a, y, dy in zip(actuators, Y, dY):
+        np.testing.assert_allclose(dy, system(a, sensor, A=A)(0.0, y))
+
+
+@pytest.mark.skipif(
+    control_problem.cuda is None or not control_problem.cuda.is_available(),
+    reason="requires a CUDA device or NUMBA_ENABLE_CUDASIM=1",
+)
+def test_lorenz_in_3_cuda():
+    cuda = control_problem.cuda
+
+    @cuda.jit(device=True)
+    def actuator(y0, y1, y2, c):
+        return -c[0] * y2
+
+    consts = np.array([[0.0], [1.0], [2.0]])
+    Yinit = np.array([[1.0, 1.0, 1.0], [-1.0, 0.5, 2.0], [0.1, 0.0, 0.0]])
+    x = np.linspace(0, 0.5, 6)
+    solve = control_problem.lorenz_in_3_cuda(actuator, threads_per_block=2)
+    Y = solve(Yinit, (10.0, 28.0, 8.0 / 3.0), x, consts=consts, substeps=10)
+
+    dY = control_problem.lorenz_in_3_batched(lambda Y: -consts[:, 0] * Y[:, 2])
+    np.testing.assert_allclose(Y, control_problem.integrate_batched(dY, Yinit, x, substeps=10), rtol=1e-12)
+
+
+def test_coupled_systems_out():
+    import scipy.integrate
+
+    dy = control_problem.fitzhugh_nagumo(lambda *y: 0.0, A=control_problem.circular_array_coupling(3))
+    y = np.random.RandomState(0).rand(6)
+    first, second = dy(0.0, y), dy(0.0, 2 * y)
+    assert first is not second
+    np.testing.assert_array_equal(first, dy(0.0, y))
+    out = np.empty(6)
+    assert dy(0.0, y, out=out) is out
+
+    x = np.linspace(0, 20, 11)
+    result = scipy.integrate.solve_ivp(dy, (0, 20), y, method="Radau", t_eval=x, rtol=1e-8, atol=1e-8)
+    assert result.success
+    np.testing.assert_allclose(result.y, control_problem.integrate(dy, y, x), rtol=1e-4, atol=1e-5)
+
+
+@requires_numbalsoda
+def test_compiled():
+    from functools import partial
+
+    def actuator(y0, y1):
+        return -0.5 * y1
+
+    x = np.linspace(0, 5, 21)
+    system = partial(control_problem.harmonic_oscillator, omega=2.0)
+    dy = control_problem.compiled(system, actuator)
+    assert isinstance(dy, control_problem.LSODASystem)
+    np.testing.assert_allclose(
+        control_problem.integrate(dy, [1.0, 0.0], x),
+        control_problem.integrate(system(actuator), [1.0, 0.0], x),
+        atol=1e-6,
+    )
+
+    def uncompilable(y0, y1, c):
+        return c * y1
+
+    dy = control_problem.compiled(control_problem.harmonic_oscillator, uncompilable)
+    assert not isinstance(dy, control_problem.LSODASystem)
+    with pytest.raises(ValueError):
+        control_problem.compiled(control_problem.van_der_pol, actuator)
+
+
+@pytest.mark.parametrize("N", [5, 200])
+@pytest.mark.parametrize("batch", [(), (3,)])
+def test_global_coupling(N, batch):
+    A = control_problem.global_coupling(N)
+    dense = np.ones((N, N)) - N * np.eye(N)
+    v = np.random.RandomState(0).rand(N, *batch)
+    np.testing.assert_array_equal(A.toarray(), dense)
+    np.testing.assert_allclose(A.dot(v), dense.dot(v))
+    np.testing.assert_allclose(A @ v, dense @ v)
+    np.testing.assert_allclose((0.5 * A).dot(v), 0.5 * dense.dot(v))
+    np.testing.assert_allclose((A + A).dot(v), 2.0 * dense.dot(v))
+    with pytest.raises(ValueError):
+        A.dot(np.ones(N + 1))
+
+
+def test_integrate():
+    x = np.linspace(0, 2, 11)
+    y = control_problem.integrate(control_problem.harmonic_oscillator(lambda y0, y1: 0.0), [1.0, 0.0], x)
+    assert y.shape == (2, len(x))
+    np.testing.assert_allclose(y[0], np.cos(x), atol=1e-5)
+
+    def blow_up(t, y):
+        return y ** 2
+
+    y = control_problem.integrate(blow_up, [1.0], x)  # y = 1 / (1 - t)
+    assert y.shape == (len(x),)
+    assert np.isnan(y).all()
+
+
+@pytest.mark.parametrize("omega, c, k", [(1.0, 1.0, 1.0), (-1.5, 0.3, 2.5)])
+def test_anharmonic_oscillator(omega, c, k):
+    def actuator(y0, y1, a):
+        return a * y0 * y1
+
+    dy = control_problem.anharmonic_oscillator(actuator, omega=omega, c=c, k=k)
+    for y0, y1 in np.random.RandomState(0).randn(5, 2):
+        expected = [y1, -(omega ** 2) * y0 - k * y0 ** 2 - c * y1 + actuator(y0, y1, 0.5)]
+        np.testing.assert_allclose(dy(0.0, [y0, y1], 0.5), expected, rtol=1e-12)
+
+
+def test_hindmarsh_rose_batched():
+    N, params = 3, dict(a=1.1, b=3.2, c=0.9, d=5.1, r=2e-3, s=3.9, xR=-1.5)
+    A = control_problem.circular_array_coupling(N)
+    Y = np.random.RandomState(0).randn(4, 3 * N)
+
+    def actuator(Y):
+        return np.sin(Y[:, 0])
+
+    dY = control_problem.hindmarsh_rose_batched(actuator, A=A, **params)(0.0, Y)
+    for y, u, dy in zip(Y, actuator(Y), dY):
+        y0, y1, y2 = np.split(y, 3)
+        np.testing.assert_allclose(dy, _hindmarsh_rose(y0, y1, y2, u, A.dot(y1), **params), rtol=1e-12)
+
+
+@pytest.fixture(params=["compiled", "numpy"])
+def rk4_kernels(request, monkeypatch):
+    if request.param == "numpy":
+        monkeypatch.setattr(control_problem, "_rk4_stage", control_problem._rk4_stage_numpy)
+        monkeypatch.setattr(control_problem, "_rk4_update", control_problem._rk4_update_numpy)
+    return request.param
+
+
+def test_integrate_batched(rk4_kernels):
+    actuators = [lambda y0, y1, y2: 0.0, lambda y0, y1, y2: -y2, lambda y0, y1, y2: np.sin(y0)]
+    Yinit = np.array([[1.0, 1.0, 1.0], [-1.0, 0.5, 2.0], [0.1, 0.0, 0.0]])
+    x = np.linspace(0, 1, 11)
+
+    dY = control_problem.lorenz_in_3_batched(control_problem.stack_actuators(actuators))
+    Y = control_problem.integrate_batched(dY, Yinit, x, substeps=100)
+    assert Y.shape == (3, 3, len(x))
+    for a, yinit, y in zip(actuators, Yinit, Y):
+        reference = control_problem.integrate(control_problem.lorenz_in_3(a), yinit, x, rtol=1e-10, atol=1e-10)
+        np.testing.assert_allclose(y, reference, rtol=1e-5, atol=1e-5)
+
+
+def test_pairwise_coupling():
+    A = control_problem.pairwise_coupling(4)
+    assert A.format == "csr"
+    np.testing.assert_array_equal(A.toarray()[:2, :2], [[-1.0, 1.0], [1.0, -1.0]])
+    A *= 2.0  # must not modify the cached matrix
+    B = control_problem.pairwise_coupling(4.0)
+    np.testing.assert_array_equal(B.toarray()[:2, :2], [[-1.0, 1.0], [1.0, -1.0]])
+    with pytest.raises(ValueError):
+        control_problem.pairwise_coupling(3)